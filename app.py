@@ -6,18 +6,47 @@
 """
 
 import os
-import json
+import re
+import time
 import logging
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request
+from cachetools import TTLCache
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+# JSON编解码：优先使用orjson，其次ujson，最后回退到标准库json
+try:
+    import orjson
+
+    _dumpb = orjson.dumps
+
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    try:
+        import ujson as _json
+    except ImportError:
+        import json as _json
+
+    def _dumps(obj):
+        return _json.dumps(obj, ensure_ascii=False)
+
+    def _dumpb(obj):
+        return _dumps(obj).encode()
+
+    _loads = _json.loads
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app)  # 允许跨域请求
 
 # ==================== 配置部分 ====================
 # 这些值将从GitHub Secrets或环境变量中读取
@@ -25,110 +54,269 @@ DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')
 FEISHU_APP_ID = os.environ.get('FEISHU_APP_ID', '')
 FEISHU_APP_SECRET = os.environ.get('FEISHU_APP_SECRET', '')
 
-# 存储飞书访问令牌（临时缓存）
-feishu_token_cache = {
-    'token': None,
-    'expire_time': 0
+FEISHU_TOKEN_URL = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+FEISHU_MESSAGE_URL = "https://open.feishu.cn/open-apis/im/v1/messages"
+DEEPSEEK_CHAT_URL = "https://api.deepseek.com/v1/chat/completions"
+
+# 固定请求头（模块加载时构建一次）
+FEISHU_AUTH_HEADERS = {"Content-Type": "application/json"}
+DEEPSEEK_HEADERS = {
+    "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+# 共享HTTP会话：复用TCP/TLS连接（keep-alive），避免每次请求重新握手
+# 重试策略：连接失败均可重试；按状态码重试仅适用于幂等方法（urllib3默认不含POST）
+# 超时统一使用(连接, 读取)二元组，连接问题2秒内暴露，读取仍允许较长的AI生成
+# 连接池容量按并发上限设置：DeepSeek流式连接由后台线程池独占，
+# 飞书接口同时被请求线程和后台线程调用；池满时多出的连接会被丢弃，失去复用效果
+AI_WORKERS = 32
+WEB_THREADS = int(os.environ.get('GUNICORN_THREADS', 16))
+HTTP_RETRY = Retry(total=2, backoff_factor=0.2,
+                   status_forcelist=[429, 500, 502, 503, 504])
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=AI_WORKERS + WEB_THREADS,
+    max_retries=HTTP_RETRY
+))
+SESSION.mount("https://api.deepseek.com", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=AI_WORKERS,
+    max_retries=HTTP_RETRY
+))
+
+# 接收ID前缀 -> receive_id_type
+RECEIVE_ID_TYPES = {"ou_": "open_id", "on_": "union_id", "oc_": "chat_id"}
+
+# 固定回复文本
+HELP_REPLY = """🤖 飞书AI助手使用指南：
+
+常用命令：
+/help - 显示此帮助信息
+/test - 测试机器人是否在线
+/about - 关于机器人
+
+直接对话：
+直接向我提问，我会尽力回答！
+
+技术支持：
+如有问题，请检查配置或联系管理员。
+
+当前状态：✅ 运行正常"""
+TEST_REPLY = "✅ 机器人连接正常！"
+ABOUT_REPLY = """📱 飞书AI助手
+版本：1.0.0
+功能：智能对话、问题解答
+技术支持：GitHub部署
+状态：运行中"""
+BUSY_REPLY = "⏳ 当前提问较多，请稍后再试。"
+
+# 预编码消息体中的接收ID占位符（含引号，发送时替换为JSON编码后的receive_id）
+RECEIVE_ID_PLACEHOLDER = "__RECEIVE_ID__"
+RECEIVE_ID_PLACEHOLDER_BYTES = _dumpb(RECEIVE_ID_PLACEHOLDER)
+
+def _encode_text_payload(text):
+    """预先编码固定文本消息的请求体"""
+    return _dumpb({
+        "receive_id": RECEIVE_ID_PLACEHOLDER,
+        "msg_type": "text",
+        "content": _dumps({"text": text})
+    })
+
+# 命令匹配：一次匹配识别所有命令关键字，命中的分组名即命令名
+COMMAND_PATTERN = re.compile(
+    r"(?P<help>/help|帮助|help)"
+    r"|(?P<test>/test|测试|ping)"
+    r"|(?P<about>/about|关于|info)",
+    re.IGNORECASE
+)
+
+# 命令分发表：命令名 -> (预编码消息体, 预编码webhook应答)
+COMMAND_TABLE = {
+    "help": (_encode_text_payload(HELP_REPLY), _dumpb({"code": 0, "msg": "help command"})),
+    "test": (_encode_text_payload(TEST_REPLY), _dumpb({"code": 0, "msg": "test command"})),
+    "about": (_encode_text_payload(ABOUT_REPLY), _dumpb({"code": 0, "msg": "about command"})),
 }
 
+# webhook固定应答（预先编码）
+ACK_DUPLICATE_BYTES = _dumpb({"code": 0, "msg": "duplicate event"})
+ACK_ACCEPTED_BYTES = _dumpb({"code": 0, "msg": "message accepted"})
+ACK_RECEIVED_BYTES = _dumpb({"code": 0, "msg": "event received"})
+ACK_BUSY_BYTES = _dumpb({"code": 0, "msg": "server busy"})
+BUSY_PAYLOAD = _encode_text_payload(BUSY_REPLY)
+
+# 健康检查响应模板（时间戳只含数字和符号，无需转义）
+HEALTH_TEMPLATE = '{"status":"healthy","timestamp":"%s"}'
+
+# 首页响应内容（预先编码）
+HOME_BYTES = _dumpb({
+    "status": "running",
+    "service": "Feishu AI Chat Bot",
+    "version": "1.0.0",
+    "endpoints": {
+        "home": "/",
+        "webhook": "/webhook (POST)",
+        "health": "/health"
+    }
+})
+
+# 流式回复：首条消息在收到足够内容（或首个换行）后发送，之后通过编辑消息逐步更新
+STREAM_FIRST_FLUSH_CHARS = 40
+STREAM_UPDATE_CHARS = 200
+STREAM_MAX_EDITS = 20  # 飞书单条消息最多可编辑20次
+
+# 后台线程池：AI调用与回复发送在此执行，webhook先行应答
+# 任务槽限制执行中加排队的任务总数，超出时直接回复繁忙，避免队列无限增长
+EXECUTOR = ThreadPoolExecutor(max_workers=AI_WORKERS)
+AI_TASK_SLOTS = threading.BoundedSemaphore(AI_WORKERS * 2)
+
+# 最近处理过的事件ID（飞书超时未收到应答会重推同一事件）
+recent_event_ids = TTLCache(maxsize=4096, ttl=12 * 3600)
+recent_event_lock = threading.Lock()
+
+# AI回复缓存：相同问题（忽略大小写与首尾空白）直接复用回复，跳过DeepSeek调用
+# 仅缓存不超过AI_CACHE_KEY_MAX字符的问题
+AI_CACHE_KEY_MAX = 512
+ai_reply_cache = TTLCache(maxsize=2048, ttl=3600)
+ai_reply_lock = threading.Lock()
+
+# 存储飞书访问令牌（临时缓存）：(token, expire_time, headers)，整体替换保证读取一致
+# headers为该令牌对应的消息请求头，仅在刷新令牌时重新构建
+# 获取失败时缓存(None, 重试时间, None)，期间直接返回失败，避免等待线程逐个重试
+FEISHU_TOKEN_RETRY_INTERVAL = 5
+feishu_token_cache = (None, 0, None)
+feishu_token_lock = threading.Lock()
+
 # ==================== 工具函数 ====================
-def get_feishu_access_token():
-    """获取飞书访问令牌（2小时有效期）"""
-    import time
+def _get_feishu_token_entry():
+    """获取飞书访问令牌缓存项(token, expire_time, headers)，令牌2小时有效"""
+    # 检查缓存是否有效（无锁快速路径，包括近期获取失败的记录）
+    entry = feishu_token_cache
+    if time.time() < entry[1]:
+        return entry
     
-    # 检查缓存是否有效
-    current_time = time.time()
-    if (feishu_token_cache['token'] and 
-        current_time < feishu_token_cache['expire_time']):
-        return feishu_token_cache['token']
+    # 缓存失效时只允许一个线程刷新，其余线程等待后复用结果（成功或失败）
+    with feishu_token_lock:
+        entry = feishu_token_cache
+        if time.time() < entry[1]:
+            return entry
+        return _fetch_feishu_access_token()
+
+def _fetch_feishu_access_token():
+    """向飞书请求新的访问令牌并写入缓存（需持有feishu_token_lock）"""
+    global feishu_token_cache
     
-    # 重新获取令牌
-    url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-    headers = {"Content-Type": "application/json"}
+    current_time = time.time()
     data = {
         "app_id": FEISHU_APP_ID,
         "app_secret": FEISHU_APP_SECRET
     }
     
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=5)
-        result = response.json()
+        response = SESSION.post(FEISHU_TOKEN_URL, headers=FEISHU_AUTH_HEADERS, json=data, timeout=(2.0, 5.0))
+        result = _loads(response.content)
         
         if result.get("code") == 0:
             token = result.get("tenant_access_token")
-            # 缓存令牌，设置过期时间（提前5分钟过期）
-            feishu_token_cache['token'] = token
-            feishu_token_cache['expire_time'] = current_time + 6600  # 110分钟
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+            # 缓存令牌，设置过期时间（提前10分钟过期）
+            feishu_token_cache = (token, current_time + 6600, headers)  # 110分钟
             logger.info("飞书令牌获取成功")
-            return token
+            return feishu_token_cache
         else:
             logger.error(f"飞书令牌获取失败: {result}")
-            return None
     except Exception as e:
         logger.error(f"获取飞书令牌异常: {str(e)}")
-        return None
+    
+    feishu_token_cache = (None, time.time() + FEISHU_TOKEN_RETRY_INTERVAL, None)
+    return feishu_token_cache
 
 def send_feishu_message(receive_id, content, msg_type="text"):
     """发送消息到飞书"""
-    token = get_feishu_access_token()
-    if not token:
-        return {"code": -1, "msg": "获取飞书令牌失败"}
-    
-    url = "https://open.feishu.cn/open-apis/im/v1/messages"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
-    # 确定接收ID类型
-    if receive_id.startswith("ou_"):
-        receive_id_type = "open_id"
-    elif receive_id.startswith("on_"):
-        receive_id_type = "union_id"
-    elif receive_id.startswith("oc_"):
-        receive_id_type = "chat_id"
-    else:
-        receive_id_type = "user_id"
-    
     # 构造消息内容
     if msg_type == "text":
         msg_content = {"text": content}
     else:
         msg_content = {"text": content}
     
-    params = {"receive_id_type": receive_id_type}
     data = {
         "receive_id": receive_id,
         "msg_type": msg_type,
-        "content": json.dumps(msg_content)
+        "content": _dumps(msg_content)
     }
+    return _post_feishu_message(receive_id, _dumpb(data))
+
+def send_feishu_payload(receive_id, payload):
+    """发送预编码的消息体（见_encode_text_payload）到飞书"""
+    body = payload.replace(RECEIVE_ID_PLACEHOLDER_BYTES, _dumpb(receive_id), 1)
+    return _post_feishu_message(receive_id, body)
+
+def _post_feishu_message(receive_id, body):
+    """调用飞书发送消息接口，body为已编码的JSON请求体"""
+    token, _, headers = _get_feishu_token_entry()
+    if not token:
+        return {"code": -1, "msg": "获取飞书令牌失败"}
+    
+    # 确定接收ID类型
+    receive_id_type = RECEIVE_ID_TYPES.get(receive_id[:3], "user_id")
+    params = {"receive_id_type": receive_id_type}
     
     try:
-        response = requests.post(url, headers=headers, params=params, json=data, timeout=10)
-        return response.json()
+        response = SESSION.post(FEISHU_MESSAGE_URL, headers=headers, params=params, data=body, timeout=(2.0, 10.0))
+        return _loads(response.content)
     except Exception as e:
         logger.error(f"发送飞书消息失败: {str(e)}")
         return {"code": -1, "msg": str(e)}
 
+def update_feishu_message(message_id, content, msg_type="text"):
+    """编辑已发送的飞书消息"""
+    token, _, headers = _get_feishu_token_entry()
+    if not token:
+        return {"code": -1, "msg": "获取飞书令牌失败"}
+    
+    data = {
+        "msg_type": msg_type,
+        "content": _dumps({"text": content})
+    }
+    
+    try:
+        response = SESSION.put(f"{FEISHU_MESSAGE_URL}/{message_id}", headers=headers, json=data, timeout=(2.0, 10.0))
+        return _loads(response.content)
+    except Exception as e:
+        logger.error(f"编辑飞书消息失败: {str(e)}")
+        return {"code": -1, "msg": str(e)}
+
 def call_ai_api(user_message):
-    """调用AI API（支持多种AI服务）"""
+    """调用AI API（支持多种AI服务），返回逐段生成的回复文本"""
+    # 命中缓存直接返回
+    key = _ai_cache_key(user_message)
+    if key is not None:
+        with ai_reply_lock:
+            cached = ai_reply_cache.get(key)
+        if cached is not None:
+            return iter([cached])
+    
     # 优先使用DeepSeek
     if DEEPSEEK_API_KEY:
         return call_deepseek_api(user_message)
     
     # 如果没有配置API密钥，返回示例回复
-    return "这是一个示例回复。请配置AI API密钥以获得真实回复。"
+    return iter(["这是一个示例回复。请配置AI API密钥以获得真实回复。"])
+
+def _ai_cache_key(user_message):
+    """AI回复缓存键；超长消息不缓存（返回None），避免截断后不同问题共用回复"""
+    key = user_message.strip().lower()
+    return key if len(key) <= AI_CACHE_KEY_MAX else None
 
 def call_deepseek_api(user_message):
-    """调用DeepSeek API"""
+    """调用DeepSeek API（流式），逐段返回生成的文本"""
     if not DEEPSEEK_API_KEY:
-        return "未配置DeepSeek API密钥"
-    
-    url = "https://api.deepseek.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
+        yield "未配置DeepSeek API密钥"
+        return
     
     data = {
         "model": "deepseek-chat",
@@ -138,153 +326,238 @@ def call_deepseek_api(user_message):
         ],
         "max_tokens": 1000,
         "temperature": 0.7,
-        "stream": False
+        "stream": True
     }
     
+    parts = []
+    try:
+        with SESSION.post(DEEPSEEK_CHAT_URL, headers=DEEPSEEK_HEADERS, json=data, timeout=(2.0, 30.0), stream=True) as response:
+            if response.status_code != 200:
+                error_msg = f"DeepSeek API错误: {response.status_code}"
+                try:
+                    error_detail = _loads(response.content)
+                    error_msg += f", {error_detail}"
+                except:
+                    # 接口均返回UTF-8，避免requests对响应体做编码探测
+                    response.encoding = "utf-8"
+                    error_msg += f", {response.text[:100]}"
+                yield error_msg
+                return
+            
+            # 解析SSE数据帧：data: {...}，以data: [DONE]结束
+            done = False
+            finish_reason = None
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == b"[DONE]":
+                    done = True
+                    break
+                choices = _loads(payload).get("choices")
+                if not choices:
+                    continue
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    parts.append(content)
+                    yield content
+            
+            if not parts:
+                yield "AI返回格式异常"
+                return
+            
+            # 未收到[DONE]即断开，视为回复中断
+            if not done:
+                yield "\n\n（回复中断：AI服务连接意外断开）"
+                return
+            
+            # 仅缓存完整接收且正常结束的回复
+            key = _ai_cache_key(user_message)
+            if key is not None and finish_reason == "stop":
+                with ai_reply_lock:
+                    ai_reply_cache[key] = "".join(parts)
+            
+    except Exception as e:
+        if _is_timeout_error(e):
+            reason = "AI服务响应超时，请稍后重试"
+        else:
+            reason = f"AI服务异常: {str(e)}"
+        # 已输出部分回答时，将中断原因另起一段，与回答内容区分开
+        yield f"\n\n（回复中断：{reason}）" if parts else reason
+
+def _is_timeout_error(e):
+    """判断是否为超时异常（流式读取时的读超时会被requests包装为ConnectionError）"""
+    if isinstance(e, requests.exceptions.Timeout):
+        return True
+    return (isinstance(e, requests.exceptions.ConnectionError)
+            and bool(e.args) and isinstance(e.args[0], ReadTimeoutError))
+
+def is_duplicate_event(event_id):
+    """判断事件是否已处理过，未处理过则记录"""
+    if not event_id:
+        return False
+    with recent_event_lock:
+        if event_id in recent_event_ids:
+            return True
+        recent_event_ids[event_id] = True
+    return False
+
+def submit_ai_reply(receive_id, user_text):
+    """提交后台AI回复任务，任务槽已满时返回False"""
+    if not AI_TASK_SLOTS.acquire(blocking=False):
+        return False
+    try:
+        EXECUTOR.submit(_run_ai_reply, receive_id, user_text)
+    except Exception:
+        AI_TASK_SLOTS.release()
+        raise
+    return True
+
+def _run_ai_reply(receive_id, user_text):
+    """执行后台AI回复任务，结束后释放任务槽"""
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        _handle_ai_reply(receive_id, user_text)
+    finally:
+        AI_TASK_SLOTS.release()
+
+def _handle_ai_reply(receive_id, user_text):
+    """后台处理普通对话：流式调用AI，先发送首段回复，再编辑消息补全内容"""
+    try:
+        reply = ""
+        message_id = None
+        first_sent = False
+        sent_len = 0
+        edits = 0
         
-        if response.status_code == 200:
-            result = response.json()
-            if "choices" in result and len(result["choices"]) > 0:
-                return result["choices"][0]["message"]["content"]
-            else:
-                return "AI返回格式异常"
+        for chunk in call_ai_api(user_text):
+            reply += chunk
+            if not first_sent:
+                if len(reply) >= STREAM_FIRST_FLUSH_CHARS or "\n" in chunk:
+                    first_sent = True
+                    send_result = send_feishu_message(receive_id, reply)
+                    if send_result.get("code") == 0:
+                        message_id = send_result.get("data", {}).get("message_id")
+                        sent_len = len(reply)
+            elif (message_id and len(reply) - sent_len >= STREAM_UPDATE_CHARS
+                  and edits < STREAM_MAX_EDITS - 1):
+                # 预留最后一次编辑用于发送完整回复
+                update_feishu_message(message_id, reply)
+                edits += 1
+                sent_len = len(reply)
+        
+        if not message_id:
+            # 回复较短或首条消息发送失败，直接发送完整回复
+            send_result = send_feishu_message(receive_id, reply)
+        elif len(reply) > sent_len:
+            send_result = update_feishu_message(message_id, reply)
         else:
-            error_msg = f"DeepSeek API错误: {response.status_code}"
-            try:
-                error_detail = response.json()
-                error_msg += f", {error_detail}"
-            except:
-                error_msg += f", {response.text[:100]}"
-            return error_msg
-            
-    except requests.exceptions.Timeout:
-        return "AI服务响应超时，请稍后重试"
+            send_result = {"code": 0, "msg": "already sent"}
+        logger.info(f"发送回复结果: {send_result}")
     except Exception as e:
-        return f"AI服务异常: {str(e)}"
+        logger.error(f"处理AI回复异常: {str(e)}", exc_info=True)
+
+def json_response(body, status=200):
+    """以已编码的JSON字节构造响应"""
+    return Response(body, status=status, mimetype="application/json", direct_passthrough=True)
 
 # ==================== 路由处理 ====================
+@app.after_request
+def add_cors_headers(response):
+    """仅为首页和健康检查允许跨域（webhook为服务端调用，无需CORS）"""
+    if request.path in ("/", "/health"):
+        response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
+
 @app.route('/')
 def home():
     """首页"""
-    return jsonify({
-        "status": "running",
-        "service": "Feishu AI Chat Bot",
-        "version": "1.0.0",
-        "endpoints": {
-            "home": "/",
-            "webhook": "/webhook (POST)",
-            "health": "/health"
-        }
-    })
+    return json_response(HOME_BYTES)
 
 @app.route('/health')
 def health_check():
     """健康检查"""
-    return jsonify({"status": "healthy", "timestamp": get_current_time()})
+    return json_response((HEALTH_TEMPLATE % get_current_time()).encode())
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """飞书事件订阅回调"""
     try:
-        data = request.json
-        logger.info(f"收到飞书事件: {json.dumps(data, ensure_ascii=False)[:200]}")
+        raw = request.get_data(cache=False)
+        data = _loads(raw) if raw else {}
+        if logger.isEnabledFor(logging.INFO):
+            # 按字节截断后再解码，避免为整个事件构造字符串
+            logger.info("收到飞书事件: %s", _dumpb(data)[:200].decode("utf-8", "replace"))
+        
+        # 一次性取出各层字段，后续只访问局部变量
+        evt_type = data.get("type")
         
         # 1. URL验证请求
-        if data.get("type") == "url_verification":
+        if evt_type == "url_verification":
             challenge = data.get("challenge", "")
             logger.info(f"URL验证请求，challenge: {challenge}")
-            return jsonify({"challenge": challenge})
+            return json_response(_dumpb({"challenge": challenge}))
         
         # 2. 事件回调
-        if data.get("type") == "event_callback":
-            event = data.get("event", {})
+        if evt_type == "event_callback":
+            event_id = data.get("uuid") or (data.get("header") or {}).get("event_id")
+            if is_duplicate_event(event_id):
+                logger.info(f"重复事件，已忽略: {event_id}")
+                return json_response(ACK_DUPLICATE_BYTES)
             
-            # 处理消息接收事件
-            if event.get("type") == "im.message.receive_v1":
-                message = event.get("message", {})
-                message_type = message.get("message_type", "")
+            event = data.get("event") or {}
+            message = event.get("message") or {}
+            
+            # 只处理文本消息接收事件
+            if (event.get("type") == "im.message.receive_v1"
+                    and message.get("message_type") == "text"):
+                # 解析消息内容
+                content = message.get("content", "{}")
+                try:
+                    user_text = _loads(content).get("text", "").strip()
+                except:
+                    user_text = content.strip()
                 
-                # 只处理文本消息
-                if message_type == "text":
-                    # 解析消息内容
-                    content = message.get("content", "{}")
-                    try:
-                        content_dict = json.loads(content)
-                        user_text = content_dict.get("text", "").strip()
-                    except:
-                        user_text = content
-                    
-                    # 获取发送者信息
-                    sender = event.get("sender", {})
-                    sender_id = sender.get("sender_id", {})
-                    user_id = sender_id.get("user_id", "")
-                    
-                    # 获取聊天信息
-                    chat_id = message.get("chat_id", "")
-                    chat_type = message.get("chat_type", "")
-                    
-                    # 确定回复对象
-                    receive_id = user_id if chat_type == "p2p" else chat_id
-                    
-                    # 处理帮助命令
-                    if user_text.lower() in ["/help", "帮助", "help"]:
-                        reply = """🤖 飞书AI助手使用指南：
-
-常用命令：
-/help - 显示此帮助信息
-/test - 测试机器人是否在线
-/about - 关于机器人
-
-直接对话：
-直接向我提问，我会尽力回答！
-
-技术支持：
-如有问题，请检查配置或联系管理员。
-
-当前状态：✅ 运行正常"""
-                        send_feishu_message(receive_id, reply)
-                        return jsonify({"code": 0, "msg": "help command"})
-                    
-                    # 处理测试命令
-                    elif user_text.lower() in ["/test", "测试", "ping"]:
-                        send_feishu_message(receive_id, "✅ 机器人连接正常！")
-                        return jsonify({"code": 0, "msg": "test command"})
+                # 获取发送者与聊天信息，确定回复对象
+                user_id = ((event.get("sender") or {}).get("sender_id") or {}).get("user_id", "")
+                receive_id = user_id if message.get("chat_type") == "p2p" else message.get("chat_id", "")
+                
+                # 处理命令（/help、/test、/about）
+                match = COMMAND_PATTERN.fullmatch(user_text)
+                if match:
+                    payload, ack_bytes = COMMAND_TABLE[match.lastgroup]
+                    send_feishu_payload(receive_id, payload)
+                    return json_response(ack_bytes)
+                
+                # 处理普通对话
+                if user_text:
+                    logger.info(f"处理用户消息: {user_id} -> {user_text[:50]}...")
                     
-                    # 处理关于命令
-                    elif user_text.lower() in ["/about", "关于", "info"]:
-                        reply = """📱 飞书AI助手
-版本：1.0.0
-功能：智能对话、问题解答
-技术支持：GitHub部署
-状态：运行中"""
-                        send_feishu_message(receive_id, reply)
-                        return jsonify({"code": 0, "msg": "about command"})
+                    # AI调用耗时较长，提交到后台线程池，先应答飞书
+                    if not submit_ai_reply(receive_id, user_text):
+                        logger.warning("后台任务已满，回复繁忙提示")
+                        send_feishu_payload(receive_id, BUSY_PAYLOAD)
+                        return json_response(ACK_BUSY_BYTES)
                     
-                    # 处理普通对话
-                    elif user_text:
-                        logger.info(f"处理用户消息: {user_id} -> {user_text[:50]}...")
-                        
-                        # 调用AI API
-                        ai_reply = call_ai_api(user_text)
-                        
-                        # 发送回复
-                        send_result = send_feishu_message(receive_id, ai_reply)
-                        logger.info(f"发送回复结果: {send_result}")
-                        
-                        return jsonify({"code": 0, "msg": "message processed"})
+                    return json_response(ACK_ACCEPTED_BYTES)
         
-        return jsonify({"code": 0, "msg": "event received"})
+        return json_response(ACK_RECEIVED_BYTES)
         
     except Exception as e:
         logger.error(f"处理webhook异常: {str(e)}", exc_info=True)
-        return jsonify({"code": 500, "msg": f"server error: {str(e)}"}), 500
+        return json_response(_dumpb({"code": 500, "msg": f"server error: {str(e)}"}), 500)
+
+# 当前时间字符串缓存：[秒级时间戳, 格式化结果]
+# 并发下最坏情况是同一秒内重复计算一次，无需加锁
+current_time_cache = [0, ""]
 
 def get_current_time():
-    """获取当前时间字符串"""
-    import time
-    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    """获取当前时间字符串（按秒缓存）"""
+    now = int(time.time())
+    if current_time_cache[0] != now:
+        current_time_cache[1] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        current_time_cache[0] = now
+    return current_time_cache[1]
 
 # ==================== 启动应用 ====================
 if __name__ == '__main__':
@@ -301,4 +574,18 @@ if __name__ == '__main__':
     logger.info(f"飞书App ID: {FEISHU_APP_ID[:10]}...")
     logger.info(f"DeepSeek API Key: {DEEPSEEK_API_KEY[:10]}..." if DEEPSEEK_API_KEY else "DeepSeek API Key: 未设置")
     
-    app.run(host='0.0.0.0', port=port, debug=False)
+    # Flask开发服务器会串行处理请求，交给gunicorn多进程+多线程运行
+    workers = os.environ.get('WEB_CONCURRENCY', '4')
+    threads = str(WEB_THREADS)
+    try:
+        os.execvp("gunicorn", [
+            "gunicorn", "-k", "gthread",
+            "-w", workers, "--threads", threads,
+            "--timeout", "0",
+            # app:app按工作目录解析，切换到本文件所在目录以支持从任意位置启动
+            "--chdir", os.path.dirname(os.path.abspath(__file__)),
+            "-b", f"0.0.0.0:{port}", "app:app"
+        ])
+    except OSError:
+        logger.warning("未找到gunicorn，使用Flask开发服务器运行")
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=True)